@@ -5,3 +5,12 @@ MYSQL_PORT = int(os.environ.get("MYSQL_PORT", 3306))
 MYSQL_ACCOUNT = os.environ.get("MYSQL_ACCOUNT", "root")
 MYSQL_PASSWORD = os.environ.get("MYSQL_PASSWORD", "mydb")
 MYSQL_DATABASE = os.environ.get("MYSQL_DATABASE", "job_market")
+MYSQL_DRIVER = os.environ.get("MYSQL_DRIVER", "mysqldb")
+MYSQL_POOL_SIZE = int(os.environ.get("MYSQL_POOL_SIZE", 10))
+MYSQL_MAX_OVERFLOW = int(os.environ.get("MYSQL_MAX_OVERFLOW", 20))
+MYSQL_POOL_RECYCLE = int(os.environ.get("MYSQL_POOL_RECYCLE", 1800))
+MYSQL_POOL_PRE_PING = os.environ.get("MYSQL_POOL_PRE_PING", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
@@ -1,5 +1,18 @@
-from datetime import datetime
-from sqlalchemy import create_engine, ForeignKey, UniqueConstraint, Table, inspect, text
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import hashlib
+import threading
+from sqlalchemy import (
+    create_engine,
+    event,
+    func,
+    ForeignKey,
+    UniqueConstraint,
+    Table,
+    inspect,
+    text,
+)
 from sqlalchemy import (
     BigInteger,
     Column,
@@ -10,7 +23,9 @@ from sqlalchemy import (
     Integer,
 )
 import logging
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.pool import QueuePool
 
 from config import (
     MYSQL_ACCOUNT,
@@ -18,6 +33,11 @@ from config import (
     MYSQL_PASSWORD,
     MYSQL_PORT,
     MYSQL_DATABASE,
+    MYSQL_DRIVER,
+    MYSQL_POOL_SIZE,
+    MYSQL_MAX_OVERFLOW,
+    MYSQL_POOL_RECYCLE,
+    MYSQL_POOL_PRE_PING,
 )
 
 # 使用更標準的日誌設定方式
@@ -26,49 +46,234 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# MySQL 錯誤碼：Unknown database
+ER_BAD_DB_ERROR = 1049
+
+# _sync_schema 的遷移邏輯版本；修改同步邏輯 (例如新增唯一鍵或刪除欄位的處理) 時遞增，
+# 讓結構指紋改變，已同步過的資料庫也會重新執行同步
+SCHEMA_SYNC_VERSION = 3
+
+# 已從模型移除、但仍保留資料的舊欄位：同步時不刪除，只改為可為空並移除其單欄唯一索引
+LEGACY_COLUMNS = {
+    # 舊版 categories 以 name (NOT NULL UNIQUE) 識別，改為 platform/category_id/sub_category_id
+    "categories": ("name",),
+}
+
+
+def _resolve_driver():
+    """
+    決定 SQLAlchemy 使用的 MySQL 驅動程式。
+
+    預設使用 C 擴充的 mysqlclient (mysqldb)，若未安裝則退回純 Python 的 pymysql。
+    """
+    if MYSQL_DRIVER == "mysqldb":
+        try:
+            import MySQLdb  # noqa: F401
+        except ImportError:
+            logger.warning("⚠️ 未安裝 mysqlclient，改用 pymysql 驅動程式")
+            return "pymysql"
+    return MYSQL_DRIVER
+
+
+def _set_session_defaults(dbapi_conn, connection_record):
+    """每條新建立的實體連線都套用的 session 設定"""
+    cursor = dbapi_conn.cursor()
+    cursor.execute("SET SESSION innodb_lock_wait_timeout=5")
+    cursor.execute("SET SESSION time_zone='+00:00'")
+    cursor.close()
+
+
+class IdCache:
+    """
+    行程內的技能名稱 / 分類鍵 → ID 快取，避免重複查詢相同的技能與分類。
+
+    以 OrderedDict 實作 LRU，超過 max_size 時淘汰最久未使用的項目；
+    kind 為 "skills" (鍵為技能名稱) 或 "categories" (鍵為 (platform, category_id, sub_category_id))。
+    """
+
+    def __init__(self, max_size=100_000):
+        self.max_size = max_size
+        self.skills = OrderedDict()
+        self.categories = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, kind, keys):
+        """回傳 {鍵: ID}，只包含快取中已有的鍵"""
+        store = getattr(self, kind)
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in store:
+                    store.move_to_end(key)
+                    found[key] = store[key]
+        return found
+
+    def put_many(self, kind, ids):
+        """寫入 {鍵: ID}，並淘汰超出容量的舊項目"""
+        store = getattr(self, kind)
+        with self._lock:
+            for key, value in ids.items():
+                store[key] = value
+                store.move_to_end(key)
+            while len(store) > self.max_size:
+                store.popitem(last=False)
+
+    def invalidate(self, kind, key=None):
+        """移除單一鍵；未指定 key 時清空整個種類"""
+        store = getattr(self, kind)
+        with self._lock:
+            if key is None:
+                store.clear()
+            else:
+                store.pop(key, None)
+
 
 class Database:
     def __init__(self):
         self.engine = self._get_database_connection()
+        self.id_cache = IdCache()
         self.metadata = MetaData()
         self._define_tables()
-        self._sync_schema()
+        fingerprint = self._schema_fingerprint()
+        if self._run_with_database(self._load_schema_fingerprint) == fingerprint:
+            logger.info("✅ 資料庫結構未變更，略過同步。")
+        else:
+            self._sync_schema()
+            self._save_schema_fingerprint(fingerprint)
         logger.info("✅ 資料庫初始化與結構同步完成。")
+        self._prewarm_pool(self.engine.pool.size())
 
-    def _get_database_connection(self):
-        try:
-            address = f"mysql+pymysql://{MYSQL_ACCOUNT}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}"
-            engine = create_engine(address)
-            with engine.connect() as conn:
-                conn.execute(text("SELECT 1"))
-            logger.info("✅ 資料庫連接成功")
-            return engine
-        except SQLAlchemyError as e:
-            logger.warning(
-                "⚠️ 無法連接到資料庫 %s (%s)，嘗試自動創建...", MYSQL_DATABASE, e
-            )
+    def _database_address(self, database=""):
+        """組合連線字串；database 為空時連到伺服器本身 (用於建立資料庫)"""
+        return f"mysql+{_resolve_driver()}://{MYSQL_ACCOUNT}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{database}"
+
+    def _create_engine(self, address):
+        """以設定檔中的連線池參數建立 engine"""
+        engine = create_engine(
+            address,
+            connect_args={"charset": "utf8mb4"},
+            poolclass=QueuePool,
+            pool_size=MYSQL_POOL_SIZE,
+            max_overflow=MYSQL_MAX_OVERFLOW,
+            pool_recycle=MYSQL_POOL_RECYCLE,
+            pool_pre_ping=MYSQL_POOL_PRE_PING,
+            future=True,
+        )
+        event.listen(engine, "connect", _set_session_defaults)
+        return engine
+
+    @contextmanager
+    def bulk_session(self):
+        """
+        開啟一個關閉 unique_checks 與 foreign_key_checks 的交易，用於大量匯入。
+
+        只適用於已確認沒有重複、且外鍵皆存在的資料；關閉唯一檢查時，
+        INSERT ... ON DUPLICATE KEY UPDATE 可能無法偵測重複。
+        離開時會恢復進入前的設定；若無法恢復，則捨棄該連線，避免以錯誤的設定放回連線池。
+        """
+        with self.engine.connect() as conn:
+            previous = None
             try:
-                server_address = f"mysql+pymysql://{MYSQL_ACCOUNT}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}"
-                server_engine = create_engine(server_address)
-                with server_engine.connect() as conn:
+                with conn.begin():
+                    previous = conn.execute(
+                        text("SELECT @@unique_checks, @@foreign_key_checks")
+                    ).one()
                     conn.execute(
-                        text(
-                            f"CREATE DATABASE IF NOT EXISTS `{MYSQL_DATABASE}` CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci"
+                        text("SET SESSION unique_checks=0, foreign_key_checks=0")
+                    )
+                    yield conn
+            finally:
+                if previous is not None:
+                    try:
+                        conn.execute(
+                            text(
+                                "SET SESSION unique_checks=:unique_checks, "
+                                "foreign_key_checks=:foreign_key_checks"
+                            ),
+                            {
+                                "unique_checks": previous[0],
+                                "foreign_key_checks": previous[1],
+                            },
                         )
+                        conn.commit()
+                    except SQLAlchemyError as e:
+                        # 不覆蓋原本的例外，只記錄並讓連線池捨棄這條連線
+                        logger.warning("⚠️ 無法恢復 session 設定，捨棄此連線: %s", e)
+                        conn.invalidate()
+
+    def _get_database_connection(self):
+        # 不額外執行 SELECT 1 探測連線：pool_pre_ping 會在實際使用時驗證，
+        # 資料庫不存在時則由 _run_with_database 在第一個查詢時自動建立
+        return self._create_engine(self._database_address(MYSQL_DATABASE))
+
+    def _create_database(self):
+        """連到 MySQL 伺服器並建立設定中的資料庫"""
+        try:
+            server_engine = self._create_engine(self._database_address())
+            with server_engine.begin() as conn:
+                conn.execute(
+                    text(
+                        f"CREATE DATABASE IF NOT EXISTS `{MYSQL_DATABASE}` CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci"
                     )
-                    logger.info("✅ 資料庫 %s 創建成功", MYSQL_DATABASE)
-                server_engine.dispose()
+                )
+                logger.info("✅ 資料庫 %s 創建成功", MYSQL_DATABASE)
+            server_engine.dispose()
+        except SQLAlchemyError as create_error:
+            logger.error("❌ 自動創建資料庫失敗: %s", create_error)
+            raise ConnectionError(
+                f"無法建立資料庫連接: {create_error}"
+            ) from create_error
+
+    def _run_with_database(self, operation):
+        """
+        執行第一個實際使用資料庫的操作。
 
-                engine = create_engine(address)
-                with engine.connect() as conn:
+        若 MySQL 回報資料庫不存在 (錯誤碼 1049)，自動建立資料庫後重試一次；
+        其他連線錯誤則轉為 ConnectionError。
+        """
+        try:
+            return operation()
+        except OperationalError as e:
+            args = getattr(e.orig, "args", ())
+            if not args or args[0] != ER_BAD_DB_ERROR:
+                logger.error("❌ 無法連接到資料庫 %s: %s", MYSQL_DATABASE, e)
+                raise ConnectionError(f"無法建立資料庫連接: {e}") from e
+            logger.warning("⚠️ 資料庫 %s 不存在，嘗試自動創建...", MYSQL_DATABASE)
+
+        self._create_database()
+        return operation()
+
+    def _prewarm_pool(self, n):
+        """
+        預先建立 n 條實體連線放回連線池，避免第一次寫入時才逐一握手。
+
+        每個工作執行緒都會持有連線直到全部取得為止，
+        確保連線池真的建立 n 條不同的連線，而不是重複使用同一條。
+        """
+        if n <= 0:
+            return
+
+        barrier = threading.Barrier(n)
+
+        def _warm():
+            try:
+                with self.engine.connect() as conn:
                     conn.execute(text("SELECT 1"))
-                logger.info("✅ 成功連接到新創建的資料庫 %s", MYSQL_DATABASE)
-                return engine
-            except SQLAlchemyError as create_error:
-                logger.error("❌ 自動創建或連接資料庫失敗: %s", create_error)
-                raise ConnectionError(
-                    f"無法建立資料庫連接: {create_error}"
-                ) from create_error
+                    barrier.wait(timeout=30)
+            except Exception:
+                # 任一連線失敗時讓其他執行緒不用等到逾時
+                barrier.abort()
+                raise
+
+        try:
+            with ThreadPoolExecutor(max_workers=n) as executor:
+                futures = [executor.submit(_warm) for _ in range(n)]
+                for future in futures:
+                    future.result()
+            logger.info("✅ 已預熱 %s 條資料庫連線", n)
+        except (SQLAlchemyError, threading.BrokenBarrierError) as e:
+            # 預熱只是最佳化，失敗時不影響後續使用
+            logger.warning("⚠️ 連線池預熱失敗: %s", e)
 
     def _define_tables(self):
         jobs_columns = [
@@ -89,15 +294,31 @@ class Database:
             Column("location", String(200)),
             Column("job_url", String(500), nullable=False, unique=True),
             Column("platform", String(100)),
-            Column("created_at", DateTime, default=datetime.now),
-            Column("updated_at", DateTime, default=datetime.now, onupdate=datetime.now),
+            Column("created_at", DateTime, server_default=func.now(), nullable=False),
+            Column(
+                "updated_at",
+                DateTime,
+                server_default=text("CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"),
+                server_onupdate=func.now(),
+                nullable=False,
+            ),
         ]
 
         categories_columns = [
             Column("id", BigInteger, primary_key=True, autoincrement=True),
-            Column("name", String(200), nullable=False, unique=True),
-            Column("created_at", DateTime, default=datetime.now),
-            Column("updated_at", DateTime, default=datetime.now, onupdate=datetime.now),
+            Column("platform", String(100), nullable=False),
+            Column("category_id", String(100), nullable=False),
+            Column("category_name", String(200)),
+            Column("sub_category_id", String(100), nullable=False),
+            Column("sub_category_name", String(200)),
+            Column("created_at", DateTime, server_default=func.now(), nullable=False),
+            Column(
+                "updated_at",
+                DateTime,
+                server_default=text("CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"),
+                server_onupdate=func.now(),
+                nullable=False,
+            ),
         ]
 
         jobs_categories_columns = [
@@ -114,15 +335,27 @@ class Database:
                 ForeignKey("jobs.id", ondelete="CASCADE"),
                 nullable=False,
             ),
-            Column("created_at", DateTime, default=datetime.now),
-            Column("updated_at", DateTime, default=datetime.now, onupdate=datetime.now),
+            Column("created_at", DateTime, server_default=func.now(), nullable=False),
+            Column(
+                "updated_at",
+                DateTime,
+                server_default=text("CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"),
+                server_onupdate=func.now(),
+                nullable=False,
+            ),
         ]
 
         skills_columns = [
             Column("id", BigInteger, primary_key=True, autoincrement=True),
             Column("name", String(200), nullable=False, unique=True),
-            Column("created_at", DateTime, default=datetime.now),
-            Column("updated_at", DateTime, default=datetime.now, onupdate=datetime.now),
+            Column("created_at", DateTime, server_default=func.now(), nullable=False),
+            Column(
+                "updated_at",
+                DateTime,
+                server_default=text("CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"),
+                server_onupdate=func.now(),
+                nullable=False,
+            ),
         ]
 
         jobs_skills_columns = [
@@ -139,78 +372,286 @@ class Database:
                 ForeignKey("skills.id", ondelete="CASCADE"),
                 nullable=False,
             ),
-            Column("created_at", DateTime, default=datetime.now),
-            Column("updated_at", DateTime, default=datetime.now, onupdate=datetime.now),
+            Column("created_at", DateTime, server_default=func.now(), nullable=False),
+            Column(
+                "updated_at",
+                DateTime,
+                server_default=text("CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"),
+                server_onupdate=func.now(),
+                nullable=False,
+            ),
         ]
 
-        Table("jobs", self.metadata, *jobs_columns)
-        Table("categories", self.metadata, *categories_columns)
-        Table(
+        self.jobs_table = Table("jobs", self.metadata, *jobs_columns)
+        self.categories_table = Table(
+            "categories",
+            self.metadata,
+            *categories_columns,
+            UniqueConstraint(
+                "platform", "category_id", "sub_category_id", name="uix_cat_triplet"
+            ),
+        )
+        self.jobs_categories_table = Table(
             "jobs_categories",
             self.metadata,
             *jobs_categories_columns,
             UniqueConstraint("job_id", "category_id", name="uix_job_category"),
         )
-        Table("skills", self.metadata, *skills_columns)
-        Table(
+        self.skills_table = Table("skills", self.metadata, *skills_columns)
+        self.jobs_skills_table = Table(
             "jobs_skills",
             self.metadata,
             *jobs_skills_columns,
             UniqueConstraint("job_id", "skill_id", name="uix_job_skill"),
         )
 
+    def _schema_fingerprint(self):
+        """以同步邏輯版本與所有資料表的 CREATE TABLE DDL 計算出穩定的 SHA-256 指紋"""
+        ddl = "\n".join(
+            [f"-- schema sync version {SCHEMA_SYNC_VERSION}"]
+            + [
+                str(CreateTable(table).compile(dialect=self.engine.dialect)).strip()
+                for table in self.metadata.sorted_tables
+            ]
+        )
+        return hashlib.sha256(ddl.encode("utf-8")).hexdigest()
+
+    def _load_schema_fingerprint(self):
+        """讀取上次同步完成時記錄的結構指紋，若尚未記錄則回傳 None"""
+        with self.engine.begin() as connection:
+            connection.execute(
+                text(
+                    "CREATE TABLE IF NOT EXISTS `schema_version` "
+                    "(`hash` CHAR(64) PRIMARY KEY, `applied_at` DATETIME)"
+                )
+            )
+            return connection.execute(
+                text("SELECT `hash` FROM `schema_version` LIMIT 1")
+            ).scalar()
+
+    def _save_schema_fingerprint(self, fingerprint):
+        """記錄本次同步後的結構指紋，schema_version 只保留一筆資料"""
+        with self.engine.begin() as connection:
+            connection.execute(text("DELETE FROM `schema_version`"))
+            connection.execute(
+                text("INSERT INTO `schema_version` VALUES (:hash, NOW())"),
+                {"hash": fingerprint},
+            )
+
+    def _column_definition(self, model_col):
+        """組合出 ALTER TABLE 使用的欄位定義，例如: `job_title` VARCHAR(200) NOT NULL"""
+        column_definition = (
+            f"`{model_col.name}` {model_col.type.compile(self.engine.dialect)}"
+        )
+        if model_col.nullable is False:
+            column_definition += " NOT NULL"
+        server_default = self._server_default_sql(model_col)
+        if server_default is not None:
+            column_definition += f" DEFAULT {server_default}"
+        return column_definition
+
+    def _server_default_sql(self, model_col):
+        """回傳欄位 server_default 的 SQL 字串，沒有設定時回傳 None"""
+        if model_col.server_default is None:
+            return None
+        arg = model_col.server_default.arg
+        if isinstance(arg, str):
+            return "'{}'".format(arg.replace("'", "''"))
+        return str(arg.compile(dialect=self.engine.dialect))
+
+    def _diff_table(self, table_name, model_columns, db_columns):
+        """
+        比較模型與資料庫中的欄位定義，回傳 (adds, mods) 兩個 ALTER TABLE 片段列表。
+
+        :param table_name: 資料表名稱。
+        :param model_columns: {欄位名稱: Column} 形式的模型欄位。
+        :param db_columns: {欄位名稱: inspector 欄位資訊} 形式的資料庫欄位。
+        """
+        adds = []
+        mods = []
+
+        # 1. 新增欄位
+        for col_name, model_col in model_columns.items():
+            if col_name not in db_columns:
+                logger.info("正在新增欄位 '%s' 到資料表 '%s'...", col_name, table_name)
+                adds.append(f"ADD COLUMN {self._column_definition(model_col)}")
+
+        # 2. 修改欄位類型 (謹慎操作)
+        for col_name, model_col in model_columns.items():
+            if col_name in db_columns:
+                db_col_type = db_columns[col_name]["type"]
+                model_col_type = model_col.type
+
+                db_type_str = str(db_col_type).upper()
+                model_type_str = str(
+                    model_col_type.compile(self.engine.dialect)
+                ).upper()
+
+                # 模型有 server_default (例如 CURRENT_TIMESTAMP) 但資料庫欄位缺少時也需修改
+                model_default = self._server_default_sql(model_col)
+                db_default = db_columns[col_name].get("default")
+                default_missing = model_default is not None and (
+                    db_default is None
+                    or ("ON UPDATE" in model_default.upper())
+                    != ("ON UPDATE" in str(db_default).upper())
+                )
+
+                # 比較型別、可否為空 (nullability) 或預設值是否有變化
+                if (
+                    db_type_str != model_type_str
+                    or db_columns[col_name]["nullable"] != model_col.nullable
+                    or default_missing
+                ):
+                    logger.warning(
+                        "偵測到資料表 '%s' 的欄位 '%s' 定義不一致。將會嘗試修改...",
+                        table_name,
+                        col_name,
+                    )
+                    mods.append(f"MODIFY COLUMN {self._column_definition(model_col)}")
+
+        return adds, mods
+
+    def _diff_unique_constraints(self, table_obj, db_unique_constraints):
+        """
+        找出模型中已命名、但資料庫尚未建立的唯一約束，回傳 ADD UNIQUE KEY 片段列表。
+
+        :param table_obj: 模型中的 Table。
+        :param db_unique_constraints: inspector.get_unique_constraints 的結果。
+        """
+        db_names = {uc["name"] for uc in db_unique_constraints}
+        db_column_sets = {tuple(uc["column_names"]) for uc in db_unique_constraints}
+        fragments = []
+        for constraint in table_obj.constraints:
+            if not isinstance(constraint, UniqueConstraint) or not constraint.name:
+                continue
+            column_names = tuple(col.name for col in constraint.columns)
+            if constraint.name in db_names or column_names in db_column_sets:
+                continue
+            logger.info(
+                "正在新增唯一索引 '%s' 到資料表 '%s'...",
+                constraint.name,
+                table_obj.name,
+            )
+            columns_sql = ", ".join(f"`{name}`" for name in column_names)
+            fragments.append(f"ADD UNIQUE KEY `{constraint.name}` ({columns_sql})")
+        return fragments
+
+    def _inspect_table(self, table_name):
+        """
+        讀取單一資料表的欄位與唯一約束，回傳 ({欄位名稱: 欄位資訊}, 唯一約束列表)。
+
+        Inspector 不是執行緒安全的，因此每次呼叫都建立自己的 Inspector。
+        """
+        inspector = inspect(self.engine)
+        columns = {col["name"]: col for col in inspector.get_columns(table_name)}
+        return columns, inspector.get_unique_constraints(table_name)
+
+    def _diff_legacy_columns(self, table_name, db_columns, db_unique_constraints):
+        """
+        回傳讓舊欄位不再妨礙寫入的 ALTER TABLE 片段：改為可為空，並移除只包含該欄位的唯一索引。
+
+        舊欄位的資料會保留，不會被刪除。
+        """
+        fragments = []
+        for col_name in LEGACY_COLUMNS.get(table_name, ()):
+            if col_name not in db_columns:
+                continue
+            for uc in db_unique_constraints:
+                if uc["column_names"] == [col_name]:
+                    logger.info(
+                        "正在移除資料表 '%s' 舊欄位 '%s' 的唯一索引 '%s'...",
+                        table_name,
+                        col_name,
+                        uc["name"],
+                    )
+                    fragments.append(f"DROP INDEX `{uc['name']}`")
+            if db_columns[col_name]["nullable"] is False:
+                logger.info(
+                    "正在將資料表 '%s' 的舊欄位 '%s' 改為可為空...",
+                    table_name,
+                    col_name,
+                )
+                col_type = db_columns[col_name]["type"].compile(self.engine.dialect)
+                fragments.append(f"MODIFY COLUMN `{col_name}` {col_type} NULL")
+        return fragments
+
+    def _check_legacy_rows(self, connection, table_name, model_columns, db_columns):
+        """
+        舊版資料表若已有資料，不能直接補上必填欄位 (會被填成空字串並違反唯一鍵)，
+        此時中止同步並提示需要手動遷移。
+        """
+        if not any(
+            col_name in db_columns for col_name in LEGACY_COLUMNS.get(table_name, ())
+        ):
+            return
+        missing_required = [
+            col_name
+            for col_name, model_col in model_columns.items()
+            if col_name not in db_columns
+            and model_col.nullable is False
+            and model_col.server_default is None
+        ]
+        if not missing_required:
+            return
+        has_rows = connection.execute(
+            text(f"SELECT 1 FROM `{table_name}` LIMIT 1")
+        ).first()
+        if has_rows:
+            message = (
+                f"資料表 '{table_name}' 為舊版結構且已有資料，無法自動新增必填欄位 "
+                f"{', '.join(missing_required)}。請先手動遷移資料 (新增並填入這些欄位) 後再啟動。"
+            )
+            logger.error("❌ %s", message)
+            raise RuntimeError(message)
+
     def _sync_schema(self):
         logger.info("正在開始同步資料庫結構...")
         self.metadata.create_all(self.engine)  # 首先確保所有表都已建立
         logger.info("✅ 已確保所有資料表都存在。")
 
         try:
+            # 各資料表的欄位資訊彼此獨立，以多執行緒並行讀取 information_schema；
+            # 實際的 ALTER TABLE 仍在下方的單一交易中依序執行
+            table_names = list(self.metadata.tables)
+            with ThreadPoolExecutor(max_workers=len(table_names)) as executor:
+                snapshots = dict(
+                    zip(table_names, executor.map(self._inspect_table, table_names))
+                )
+            schema_snapshot = {
+                table_name: columns for table_name, (columns, _) in snapshots.items()
+            }
+            unique_snapshot = {
+                table_name: uniques for table_name, (_, uniques) in snapshots.items()
+            }
+
             with self.engine.begin() as connection:  # 使用事務來確保操作的原子性
-                inspector = inspect(self.engine)
+                # MySQL 的 DDL 會隱含 commit，因此在執行任何 ALTER TABLE 前先檢查所有舊版資料表
                 for table_name, table_obj in self.metadata.tables.items():
-                    db_columns = {
-                        col["name"]: col for col in inspector.get_columns(table_name)
-                    }
-                    model_columns = {col.name: col for col in table_obj.c}
+                    self._check_legacy_rows(
+                        connection,
+                        table_name,
+                        {col.name: col for col in table_obj.c},
+                        schema_snapshot[table_name],
+                    )
 
-                    # 1. 新增欄位
-                    for col_name, model_col in model_columns.items():
-                        if col_name not in db_columns:
-                            add_stmt = f"ALTER TABLE `{table_name}` ADD COLUMN {model_col.compile(dialect=self.engine.dialect)}"
-                            logger.info(
-                                f"正在新增欄位 '{col_name}' 到資料表 '{table_name}'..."
-                            )
-                            connection.execute(text(add_stmt))
-
-                    # 2. 修改欄位類型 (謹慎操作)
-                    for col_name, model_col in model_columns.items():
-                        if col_name in db_columns:
-                            db_col_type = db_columns[col_name]["type"]
-                            model_col_type = model_col.type
-
-                            db_type_str = str(db_col_type).upper()
-                            model_type_str = str(
-                                model_col_type.compile(self.engine.dialect)
-                            ).upper()
-
-                            # 比較型別或可否為空 (nullability) 是否有變化
-                            if (
-                                db_type_str != model_type_str
-                                or db_columns[col_name]["nullable"]
-                                != model_col.nullable
-                            ):
-                                logger.warning(
-                                    f"偵測到資料表 '{table_name}' 的欄位 '{col_name}' 定義不一致。將會嘗試修改..."
-                                )
-                                # **【修正處】**：手動組合出正確的欄位定義字串
-                                # 例如: `job_title` VARCHAR(200) NOT NULL
-                                column_definition = f"`{model_col.name}` {model_col_type.compile(self.engine.dialect)}"
-                                if model_col.nullable is False:
-                                    column_definition += " NOT NULL"
-
-                                # 組合出最終的、語法正確的 SQL
-                                modify_stmt = f"ALTER TABLE `{table_name}` MODIFY COLUMN {column_definition}"
-                                connection.execute(text(modify_stmt))
+                for table_name, table_obj in self.metadata.tables.items():
+                    model_columns = {col.name: col for col in table_obj.c}
+                    # 收集所有欄位變更，最後合併成單一 ALTER TABLE，
+                    # 避免 MySQL 對每個變更都重建一次資料表
+                    adds, mods = self._diff_table(
+                        table_name, model_columns, schema_snapshot[table_name]
+                    )
+                    uniques = self._diff_unique_constraints(
+                        table_obj, unique_snapshot[table_name]
+                    )
+                    legacy = self._diff_legacy_columns(
+                        table_name,
+                        schema_snapshot[table_name],
+                        unique_snapshot[table_name],
+                    )
+                    if legacy or adds or mods or uniques:
+                        alter_stmt = f"ALTER TABLE `{table_name}` {', '.join(legacy + adds + mods + uniques)}"
+                        connection.execute(text(alter_stmt))
 
             logger.info("✅ 資料庫結構同步完成。")
         except SQLAlchemyError as e:
@@ -218,8 +659,22 @@ class Database:
             raise
 
 
+_DB_SINGLETON = None
+_DB_LOCK = threading.Lock()
+
+
+def get_database():
+    """回傳行程內共用的 Database 實例，第一次呼叫時才建立並同步結構"""
+    global _DB_SINGLETON
+    if _DB_SINGLETON is None:
+        with _DB_LOCK:
+            if _DB_SINGLETON is None:
+                _DB_SINGLETON = Database()
+    return _DB_SINGLETON
+
+
 if __name__ == "__main__":
     try:
-        Database()
+        get_database()
     except ConnectionError as e:
         logger.error("初始化程序因資料庫連接問題而終止。")
@@ -1,122 +1,399 @@
 import logging
-from sqlalchemy import select
-from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+import time
+from collections import namedtuple
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.exc import IntegrityError, OperationalError, SQLAlchemyError
 
-# 假設您已經在某處初始化了 Database 實例
-# from .init_db import Database
-# db = Database()
+# 透過 get_database() 取得行程內共用的 Database 實例
+# from .init_db import get_database
+# db = get_database()
 
 logger = logging.getLogger(__name__)
 
+CATEGORY_KEY = ("platform", "category_id", "sub_category_id")
 
-def add_job(db, job_details, skills_names, categories_data):
+# add_jobs_bulk 的單筆輸入：職缺資訊字典、技能名稱列表、分類字典列表
+JobPayload = namedtuple("JobPayload", ["details", "skills", "categories"])
+
+# MySQL 錯誤碼：Deadlock found when trying to get lock
+ER_LOCK_DEADLOCK = 1213
+# MySQL 錯誤碼：Cannot add or update a child row: a foreign key constraint fails
+ER_NO_REFERENCED_ROW_2 = 1452
+MAX_DEADLOCK_RETRIES = 3
+
+
+def _is_deadlock(error):
+    """判斷例外是否為 InnoDB 死結 (MySQL 錯誤碼 1213)"""
+    if not isinstance(error, OperationalError):
+        return False
+    args = getattr(error.orig, "args", ())
+    return bool(args) and args[0] == ER_LOCK_DEADLOCK
+
+
+def _run_with_deadlock_retry(operation):
+    """
+    執行一個完整的交易，若遇到 InnoDB 死結則以指數退避 (0.01 * 2**k 秒) 重試。
+
+    死結會讓 InnoDB 復原整個交易，因此 operation 必須自行開啟並提交交易。
+    """
+    for attempt in range(MAX_DEADLOCK_RETRIES + 1):
+        try:
+            return operation()
+        except OperationalError as e:
+            if not _is_deadlock(e) or attempt == MAX_DEADLOCK_RETRIES:
+                raise
+            delay = 0.01 * 2**attempt
+            logger.warning(
+                "⚠️ 偵測到死結，%.2f 秒後重試 (%s/%s)",
+                delay,
+                attempt + 1,
+                MAX_DEADLOCK_RETRIES,
+            )
+            time.sleep(delay)
+
+
+def _lock_order(key):
+    """
+    排序用的鍵，讓並行的交易以相同順序取得鎖。
+
+    None 會排在最後而不是引發 TypeError，留給資料庫以 NOT NULL 約束回報錯誤。
+    """
+    values = key if isinstance(key, tuple) else (key,)
+    return tuple((value is None, str(value)) for value in values)
+
+
+def _uniform_rows(rows):
+    """
+    executemany 需要每筆資料的欄位一致，將缺少的欄位補 None。
+
+    只補齊輸入中出現過的欄位，未出現的欄位仍交給資料庫的預設值。
+    """
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    return [{key: row.get(key) for key in columns} for row in rows]
+
+
+def _upsert_ids(conn, table, rows, key_names):
+    """
+    以 INSERT ... ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id) 確保資料存在，
+    並回傳 {唯一鍵 tuple: ID}，鍵一律是輸入資料中的原始值。
+
+    單筆時直接由 lastrowid 取得新建或既有的 ID；多筆時批次寫入後再以一次 SELECT 取回。
+    欄位使用 utf8mb4_unicode_ci，資料庫中的值可能與輸入只差在大小寫或結尾空白，
+    SELECT 結果對不上的鍵會再逐筆 upsert，由 lastrowid 取得對應的 ID。
+    """
+    stmt = mysql_insert(table).on_duplicate_key_update(
+        id=func.last_insert_id(table.c.id)
+    )
+
+    def _key(row):
+        return tuple(row[key] for key in key_names)
+
+    if len(rows) == 1:
+        result = conn.execute(stmt, rows[0])
+        return {_key(rows[0]): result.lastrowid}
+
+    conn.execute(stmt, _uniform_rows(rows))
+    key_columns = [table.c[key] for key in key_names]
+    result = conn.execute(
+        select(table.c.id, *key_columns).where(
+            tuple_(*key_columns).in_([_key(row) for row in rows])
+        )
+    )
+    stored_ids = {tuple(row[1:]): row.id for row in result}
+
+    ids = {}
+    for row in rows:
+        key = _key(row)
+        if key in stored_ids:
+            ids[key] = stored_ids[key]
+        else:
+            ids[key] = conn.execute(stmt, row).lastrowid
+    return ids
+
+
+def _resolve_skill_ids(conn, db, skills_names):
+    """
+    確保技能存在，並回傳 {技能名稱: ID}。
+
+    優先使用 db.id_cache，只有快取未命中的技能才會寫入資料庫。
+    技能依名稱排序後再寫入，讓並行的交易以相同順序取得鎖，避免死結。
+    """
+    names = sorted(set(skills_names), key=_lock_order)
+    if not names:
+        return {}
+
+    skill_ids = db.id_cache.get_many("skills", names)
+    misses = [name for name in names if name not in skill_ids]
+    if misses:
+        ids = _upsert_ids(
+            conn, db.skills_table, [{"name": name} for name in misses], ("name",)
+        )
+        skill_ids.update({key[0]: skill_id for key, skill_id in ids.items()})
+    return skill_ids
+
+
+def _resolve_category_ids(conn, db, categories_data):
+    """
+    確保分類存在，並回傳 {(platform, category_id, sub_category_id): ID}。
+
+    分類以 uix_cat_triplet 複合唯一鍵識別，並優先使用 db.id_cache；
+    與技能相同，依唯一鍵排序後再寫入以避免死結。
+    """
+    unique_categories = {
+        tuple(cat_data[key] for key in CATEGORY_KEY): cat_data
+        for cat_data in categories_data
+    }
+    unique_categories = dict(
+        sorted(unique_categories.items(), key=lambda item: _lock_order(item[0]))
+    )
+    if not unique_categories:
+        return {}
+
+    category_ids = db.id_cache.get_many("categories", unique_categories)
+    misses = [
+        cat_data
+        for key, cat_data in unique_categories.items()
+        if key not in category_ids
+    ]
+    if misses:
+        category_ids.update(
+            _upsert_ids(conn, db.categories_table, misses, CATEGORY_KEY)
+        )
+    return category_ids
+
+
+def _insert_links(conn, db, table, rows, kind, ids):
     """
-    在單一交易中，插入一筆職缺及其關聯的分類和技能。
+    以單一 executemany 寫入多筆關聯資料，已存在的關聯會被略過。
+
+    使用 ON DUPLICATE KEY UPDATE 而非 INSERT IGNORE，讓外鍵錯誤仍會拋出；
+    外鍵錯誤代表 ids 中可能有來自快取、但已不存在的 ID，因此一併清除 kind 中對應的快取。
+
+    :param kind: 關聯目標在 db.id_cache 中的種類 ("skills" 或 "categories")。
+    :param ids: 產生 rows 所使用的 {鍵: ID}。
+    """
+    if not rows:
+        return
+    stmt = mysql_insert(table).on_duplicate_key_update(job_id=table.c.job_id)
+    try:
+        conn.execute(stmt, rows)
+    except IntegrityError as e:
+        args = getattr(e.orig, "args", ())
+        if args and args[0] == ER_NO_REFERENCED_ROW_2:
+            for key in ids:
+                db.id_cache.invalidate(kind, key)
+        raise
+
+
+def _insert_job(conn, db, job_details, skills_names, categories_data):
+    """
+    在目前的交易中插入職缺及其關聯，回傳 (job_id, skill_ids, category_ids)。
+
+    與 _insert_job_batch 相同，依 技能 → 分類 → 職缺 → 關聯 的順序寫入，
+    讓 add_job 與 add_jobs_bulk 以相同的資料表順序取得鎖。
+    """
+    # 步驟 1: 批次建立技能與分類並取得 ID
+    skill_ids = _resolve_skill_ids(conn, db, skills_names)
+    category_ids = _resolve_category_ids(conn, db, categories_data)
+
+    # 步驟 2: 插入職缺並取得 ID
+    job_insert_stmt = db.jobs_table.insert().values(**job_details)
+    # 直接讀取 cursor.lastrowid，不需組出 inserted_primary_key
+    job_id = conn.execute(job_insert_stmt).lastrowid
+    logger.debug("新增職缺 '%s'，ID 為: %s", job_details.get("job_title"), job_id)
+
+    # 步驟 3: 一次寫入所有職缺與技能、職缺與分類的關聯
+    _insert_links(
+        conn,
+        db,
+        db.jobs_skills_table,
+        [{"job_id": job_id, "skill_id": skill_id} for skill_id in skill_ids.values()],
+        "skills",
+        skill_ids,
+    )
+    _insert_links(
+        conn,
+        db,
+        db.jobs_categories_table,
+        [
+            {"job_id": job_id, "category_id": category_id}
+            for category_id in category_ids.values()
+        ],
+        "categories",
+        category_ids,
+    )
+
+    return job_id, skill_ids, category_ids
+
+
+def _insert_job_in_savepoint(conn, db, job_details, skills_names, categories_data):
+    """
+    在呼叫端的交易中以 SAVEPOINT 插入職缺，回傳職缺 ID。
+
+    只有被 SAVEPOINT 隔離的錯誤會復原這筆職缺並回傳 None；死結 (InnoDB 會復原
+    整個外層交易)、連線中斷、SAVEPOINT 無法復原或釋放等會讓外層交易失效的錯誤會直接拋出。
+    """
+    savepoint = conn.begin_nested()
+    try:
+        job_id, _, _ = _insert_job(conn, db, job_details, skills_names, categories_data)
+    except SQLAlchemyError as e:
+        if (
+            _is_deadlock(e)
+            or getattr(e, "connection_invalidated", False)
+            or conn.invalidated
+        ):
+            raise
+        # ROLLBACK TO SAVEPOINT 失敗時直接拋出，交由呼叫端處理
+        savepoint.rollback()
+        if not conn.in_transaction():
+            raise
+        logger.error("❌ 寫入職缺時發生錯誤，已復原至 SAVEPOINT: %s", e)
+        return None
+
+    # RELEASE SAVEPOINT 失敗時直接拋出，交由呼叫端處理
+    savepoint.commit()
+    return job_id
+
+
+def add_job(db, job_details, skills_names, categories_data, conn=None):
+    """
+    在單一交易中，插入一筆職缺及其關聯的分類和技能，遇到死結時會自動重試。
+
+    若傳入 conn，則在該連線上以 SAVEPOINT 執行，適合爬蟲在迴圈中共用同一條連線；
+    最終的 commit 由呼叫端負責。只有被 SAVEPOINT 隔離的錯誤會回傳 None，
+    會讓外層交易失效的錯誤 (例如死結、連線中斷) 則直接拋出，此時先前回傳的
+    職缺 ID 也已一併被復原，呼叫端必須 rollback 並重新寫入整批資料。此時外層交易尚未 commit，新取得的 ID 不會寫入共用的 db.id_cache。
 
     :param db: 從 init_db.py 初始化的 Database 物件。
     :param job_details: 一個包含職缺主要資訊的字典。
     :param skills_names: 一個包含技能名稱字串的列表 (e.g., ['Python', 'SQL'])。
     :param categories_data: 一個包含多個分類字典的列表。
+    :param conn: 選填，呼叫端持有的連線。
     :return: 新增職缺的 ID，若失敗則回傳 None。
     """
-    with db.engine.connect() as conn:
-        # conn.begin() 會開啟一個交易，並在區塊結束時自動 commit，
-        # 或在發生錯誤時自動 rollback。
-        with conn.begin() as transaction:
-            try:
-                # 步驟 1: 插入職缺並取得 ID
-                job_insert_stmt = db.jobs_table.insert().values(**job_details)
-                result = conn.execute(job_insert_stmt)
-                job_id = result.inserted_primary_key[0]
-                logger.info(
-                    "新增職缺 '%s'，ID 為: %s", job_details.get("job_title"), job_id
-                )
-
-                for skill_name in skills_names:
-                    # 查詢技能是否存在
-                    select_skill_stmt = select(db.skills_table.c.id).where(
-                        db.skills_table.c.name == skill_name
-                    )
-                    skill_row = conn.execute(select_skill_stmt).first()
-
-                    if skill_row:
-                        skill_id = skill_row.id
-                    else:
-                        # 建立新技能
-                        insert_skill_stmt = db.skills_table.insert().values(
-                            name=skill_name
-                        )
-                        skill_result = conn.execute(insert_skill_stmt)
-                        skill_id = skill_result.inserted_primary_key[0]
-                        logger.info("新增技能 '%s'，ID 為: %s", skill_name, skill_id)
-
-                    # 建立職缺與技能的關聯
-                    try:
-                        insert_job_skill_stmt = db.jobs_skills_table.insert().values(
-                            job_id=job_id, skill_id=skill_id
-                        )
-                        conn.execute(insert_job_skill_stmt)
-                    except IntegrityError:
-                        # 如果因為唯一約束而失敗，表示關聯已存在，可以安全地忽略
-                        logger.warning(
-                            "職缺 %s 和技能 %s 的關聯已存在，跳過。", job_id, skill_id
-                        )
-
-                for cat_data in categories_data:
-                    # 根據唯一約束查詢分類是否存在
-                    select_cat_stmt = select(db.categories_table.c.id).where(
-                        (db.categories_table.c.platform == cat_data["platform"])
-                        & (db.categories_table.c.category_id == cat_data["category_id"])
-                        & (
-                            db.categories_table.c.sub_category_id
-                            == cat_data["sub_category_id"]
-                        )
-                    )
-                    cat_row = conn.execute(select_cat_stmt).first()
-
-                    if cat_row:
-                        category_id = cat_row.id
-                    else:
-                        # 建立新分類
-                        insert_cat_stmt = db.categories_table.insert().values(
-                            **cat_data
-                        )
-                        cat_result = conn.execute(insert_cat_stmt)
-                        category_id = cat_result.inserted_primary_key[0]
-                        logger.info(
-                            "新增分類 '%s'，ID 為: %s",
-                            cat_data.get("sub_category_name"),
-                            category_id,
-                        )
-
-                    # 建立職缺與分類的關聯
-                    try:
-                        insert_job_cat_stmt = db.jobs_categories_table.insert().values(
-                            job_id=job_id, category_id=category_id
-                        )
-                        conn.execute(insert_job_cat_stmt)
-                    except IntegrityError:
-                        logger.warning(
-                            "職缺 %s 和分類 %s 的關聯已存在，跳過。",
-                            job_id,
-                            category_id,
-                        )
-
-                logger.info("✅ 成功寫入職缺 %s 及其所有關聯", job_id)
-                # 交易區塊順利結束，會自動 commit
-                return job_id
-
-            except SQLAlchemyError as e:
-                logger.error("❌ 寫入職缺時發生錯誤，交易已復原: %s", e)
-                # 交易區塊發生錯誤，會自動 rollback
-                return None
+    if conn is not None:
+        # 外層交易尚未 commit，其他執行緒還看不到這些資料，因此不寫入快取
+        job_id = _insert_job_in_savepoint(
+            conn, db, job_details, skills_names, categories_data
+        )
+        if job_id is not None and logger.isEnabledFor(logging.INFO):
+            logger.info("✅ 成功寫入職缺 %s 及其所有關聯", job_id)
+        return job_id
+
+    def _write():
+        with db.engine.connect() as conn:
+            # conn.begin() 會開啟一個交易，並在區塊結束時自動 commit，
+            # 或在發生錯誤時自動 rollback。
+            with conn.begin():
+                return _insert_job(conn, db, job_details, skills_names, categories_data)
+
+    try:
+        job_id, skill_ids, category_ids = _run_with_deadlock_retry(_write)
+        # 交易 commit 後才寫入快取，避免快取到已被 rollback 的 ID
+        db.id_cache.put_many("skills", skill_ids)
+        db.id_cache.put_many("categories", category_ids)
+
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("✅ 成功寫入職缺 %s 及其所有關聯", job_id)
+        return job_id
+
+    except SQLAlchemyError as e:
+        logger.error("❌ 寫入職缺時發生錯誤，交易已復原: %s", e)
+        return None
+
+
+def _insert_job_batch(conn, db, batch):
+    """
+    在目前的交易中插入一批職缺及其關聯，回傳 ({job_url: ID}, skill_ids, category_ids)。
+    """
+    skill_ids = _resolve_skill_ids(
+        conn, db, [name for job in batch for name in job.skills]
+    )
+    category_ids = _resolve_category_ids(
+        conn, db, [cat for job in batch for cat in job.categories]
+    )
+
+    # job_url 已存在時只略過該筆，其他錯誤 (NOT NULL、截斷、外鍵) 仍會拋出；
+    # 依 job_url 排序，讓並行的交易以相同順序鎖定唯一索引
+    job_rows = {job.details["job_url"]: job.details for job in batch}
+    ids = _upsert_ids(
+        conn,
+        db.jobs_table,
+        [job_rows[url] for url in sorted(job_rows, key=_lock_order)],
+        ("job_url",),
+    )
+    url_to_id = {key[0]: job_id for key, job_id in ids.items()}
+
+    skill_rows = []
+    category_rows = []
+    for job in batch:
+        job_id = url_to_id[job.details["job_url"]]
+        skill_rows.extend(
+            {"job_id": job_id, "skill_id": skill_ids[name]}
+            for name in dict.fromkeys(job.skills)
+        )
+        category_rows.extend(
+            {
+                "job_id": job_id,
+                "category_id": category_ids[tuple(cat[key] for key in CATEGORY_KEY)],
+            }
+            for cat in job.categories
+        )
+    _insert_links(conn, db, db.jobs_skills_table, skill_rows, "skills", skill_ids)
+    _insert_links(
+        conn, db, db.jobs_categories_table, category_rows, "categories", category_ids
+    )
+
+    return url_to_id, skill_ids, category_ids
+
+
+def add_jobs_bulk(db, jobs, chunk=500):
+    """
+    批次寫入多筆職缺及其關聯，每 chunk 筆職缺只使用一個交易。
+
+    每個批次只需要職缺、技能與分類各一次 upsert，以及兩次關聯表的寫入。
+    job_url 已存在的職缺會被略過寫入，但仍會補上其關聯。遇到死結時會重試整個批次。
+
+    :param db: 從 init_db.py 初始化的 Database 物件。
+    :param jobs: JobPayload (或 (details, skills, categories) tuple) 的列表。
+    :param chunk: 每個交易處理的職缺數量。
+    :return: 與輸入順序對應的職缺 ID 列表；若失敗則回傳 None
+             (失敗前已完成的批次仍會保留)。
+    """
+    job_ids = []
+    try:
+        with db.engine.connect() as conn:
+            for start in range(0, len(jobs), chunk):
+                batch = [JobPayload(*job) for job in jobs[start : start + chunk]]
+
+                def _write():
+                    with conn.begin():
+                        return _insert_job_batch(conn, db, batch)
+
+                url_to_id, skill_ids, category_ids = _run_with_deadlock_retry(_write)
+
+                # 交易 commit 後才寫入快取，避免快取到已被 rollback 的 ID
+                db.id_cache.put_many("skills", skill_ids)
+                db.id_cache.put_many("categories", category_ids)
+                job_ids.extend(url_to_id[job.details["job_url"]] for job in batch)
+                logger.info("✅ 成功批次寫入 %s 筆職缺及其所有關聯", len(batch))
+        return job_ids
+
+    except SQLAlchemyError as e:
+        logger.error(
+            "❌ 批次寫入職缺時發生錯誤，目前批次已復原 (已寫入 %s 筆): %s",
+            len(job_ids),
+            e,
+        )
+        return None
 
 
 # --- 使用範例 ---
 def main_example():
     # 假設這是您的 Database 物件
-    # from database.init_db import Database
-    # db = Database()
+    # from database.init_db import get_database
+    # db = get_database()
 
     # 為了能獨立執行，這裡做一個假的 db 物件
     from unittest.mock import MagicMock
@@ -156,7 +433,21 @@ def main_example():
 
     # 4. 呼叫函數
     # 假設 db 物件已正確初始化
-    # add_job_with_details(db, job_data, skills, categories)
+    # add_job(db, job_data, skills, categories)
+    #
+    # 爬蟲一次寫入多筆職缺時，可共用同一條連線，每筆職缺以 SAVEPOINT 隔離。
+    # add_job 拋出例外時外層交易已失效，離開 with 區塊會 rollback，整批需重新寫入；
+    # 死結時以 _run_with_deadlock_retry 重新執行整批，其他錯誤則交由呼叫端處理:
+    # def write_batch():
+    #     with db.engine.connect() as conn:
+    #         job_ids = [
+    #             add_job(db, job_data, skills, categories, conn=conn)
+    #             for job_data, skills, categories in crawled_jobs
+    #         ]
+    #         conn.commit()
+    #         return job_ids
+    #
+    # job_ids = _run_with_deadlock_retry(write_batch)
     print("範例資料準備完成，您可以將 `add_job_with_details` 函數整合到您的專案中。")
 
 